@@ -2,41 +2,90 @@
 Configuration module for SESAME Web API
 """
 
+import functools
 import os
-from typing import Optional
+import sys
+from dataclasses import dataclass
 
+from dotenv import load_dotenv
 
+
+def load_env():
+    """Load variables from the .env file, once per process tree.
+
+    Child processes (e.g. the daemonized server) inherit the loaded environment,
+    so the marker variable lets them skip parsing the file again.
+    """
+    if not os.environ.get("_DOTENV_LOADED"):
+        load_dotenv()
+        os.environ["_DOTENV_LOADED"] = "1"
+
+
+@dataclass(frozen=True)
 class Config:
     """Configuration class for SESAME Web API."""
-    
+
     # SESAME Device Configuration
-    BLE_UUID: str = os.getenv("SESAME_BLE_UUID", "")
-    SECRET_KEY: str = os.getenv("SESAME_SECRET_KEY", "")
-    PUBLIC_KEY: str = os.getenv("SESAME_PUBLIC_KEY", "")
-    SCAN_DURATION: int = int(os.getenv("SESAME_SCAN_DURATION", "15"))
-    
+    BLE_UUID: str = ""
+    SECRET_KEY: str = ""
+    PUBLIC_KEY: str = ""
+    SCAN_DURATION: int = 15
+
+    # Connection Pooling Configuration
+    CONNECTION_TIMEOUT: int = 1800  # 30 minutes in seconds
+    MAX_RECONNECT_ATTEMPTS: int = 5
+    DEVICE_CACHE_TTL: int = 300  # 5 minutes in seconds
+
     # Server Configuration
-    HOST: str = os.getenv("HOST", "0.0.0.0")
-    PORT: int = int(os.getenv("PORT", "8000"))
-    DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
-    
+    HOST: str = "0.0.0.0"
+    PORT: int = 8000
+    DEBUG: bool = False
+
     # Logging Configuration
-    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
-    
+    LOG_LEVEL: str = "INFO"
+
     @classmethod
-    def validate(cls) -> bool:
+    def from_env(cls) -> "Config":
+        """Build the configuration from environment variables."""
+        return cls(
+            BLE_UUID=os.getenv("SESAME_BLE_UUID", ""),
+            SECRET_KEY=os.getenv("SESAME_SECRET_KEY", ""),
+            PUBLIC_KEY=os.getenv("SESAME_PUBLIC_KEY", ""),
+            SCAN_DURATION=int(os.getenv("SESAME_SCAN_DURATION", "15")),
+            CONNECTION_TIMEOUT=int(os.getenv("SESAME_CONNECTION_TIMEOUT", "1800")),
+            MAX_RECONNECT_ATTEMPTS=int(os.getenv("SESAME_MAX_RECONNECT_ATTEMPTS", "5")),
+            DEVICE_CACHE_TTL=int(os.getenv("SESAME_DEVICE_CACHE_TTL", "300")),
+            HOST=os.getenv("HOST", "0.0.0.0"),
+            PORT=int(os.getenv("PORT", "8000")),
+            DEBUG=os.getenv("DEBUG", "false").lower() == "true",
+            LOG_LEVEL=os.getenv("LOG_LEVEL", "INFO"),
+        )
+
+    @property
+    def event_loop(self) -> str:
+        """uvicorn event loop; uvloop has no Windows support, use stock asyncio there."""
+        return "asyncio" if sys.platform == "win32" else "uvloop"
+    
+    def validate(self) -> bool:
         """Validate that required configuration is present."""
-        if not cls.BLE_UUID:
+        if not self.BLE_UUID:
             raise ValueError("SESAME_BLE_UUID environment variable is required")
-        
-        if not cls.SECRET_KEY:
+
+        if not self.SECRET_KEY:
             raise ValueError("SESAME_SECRET_KEY environment variable is required")
-        
-        if not cls.PUBLIC_KEY:
+
+        if not self.PUBLIC_KEY:
             raise ValueError("SESAME_PUBLIC_KEY environment variable is required")
-        
+
         return True
 
 
+@functools.lru_cache(maxsize=1)
+def get_config() -> Config:
+    """Return the configuration, read from the environment once per process."""
+    load_env()
+    return Config.from_env()
+
+
 # Global config instance
-config = Config()
+config = get_config()
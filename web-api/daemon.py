@@ -7,16 +7,21 @@ A Python daemon script to run the SESAME web app in the background.
 import os
 import sys
 import time
+import fcntl
 import signal
 import logging
+import select
+import socket
+import runpy
 import argparse
-import subprocess
+import traceback
+from collections import deque
 from pathlib import Path
-from typing import Optional
+from typing import Callable
 
-# Load environment variables from .env file
-from dotenv import load_dotenv
-load_dotenv()
+# Load environment variables from .env file, the server process inherits them
+from config import get_config, load_env
+load_env()
 
 # Setup logging
 logging.basicConfig(
@@ -25,27 +30,130 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# `logs` shows this many lines, read from at most the last block of the file
+TAIL_LINES = 50
+TAIL_BLOCK_SIZE = 64 * 1024
+# How long `start` waits for the server to accept connections
+STARTUP_TIMEOUT = 30.0
+
+
+def _wait_until(predicate: Callable[[], bool], timeout: float, initial: float = 0.01, cap: float = 0.5) -> bool:
+    """Poll a predicate with exponential backoff until it holds or the timeout expires."""
+    deadline = time.monotonic() + timeout
+    delay = initial
+    while not predicate():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, cap)
+    return True
+
+
+def _pid_alive(pid: int) -> bool:
+    """Check if a process with the given PID exists."""
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _wait_for_exit(pid: int, timeout: float) -> bool:
+    """Wait for a process to exit, using a pidfd on Linux and polling elsewhere."""
+    if hasattr(os, "pidfd_open"):
+        try:
+            fd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            # Kernel without pidfd support, fall back to polling
+            pass
+        else:
+            try:
+                readable, _, _ = select.select([fd], [], [], timeout)
+                return bool(readable)
+            finally:
+                os.close(fd)
+    return _wait_until(lambda: not _pid_alive(pid), timeout)
+
+
+# Wildcard bind addresses can't be connected to, probe loopback for them instead
+_WILDCARD_HOSTS = {"": "127.0.0.1", "0.0.0.0": "127.0.0.1", "::": "::1"}
+
+
+def _port_open(host: str, port: int, timeout: float = 0.2) -> bool:
+    """Check if a server is accepting connections on the address it binds to."""
+    try:
+        with socket.create_connection((_WILDCARD_HOSTS.get(host, host), port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def _file_change_waiter(path: Path) -> tuple[Callable[[], None], Callable[[], None]]:
+    """Return a (wait, close) pair, where wait() blocks until the file is modified.
+    
+    Uses inotify on Linux (inotify_simple), kqueue on BSD/macOS and falls back to polling.
+    """
+    try:
+        from inotify_simple import INotify, flags
+    except ImportError:
+        INotify = None
+        
+    if INotify is not None:
+        inotify = INotify()
+        inotify.add_watch(path, flags.MODIFY)
+        return inotify.read, inotify.close
+    
+    if hasattr(select, "kqueue"):
+        fd = os.open(path, os.O_RDONLY)
+        kq = select.kqueue()
+        kq.control([select.kevent(
+            fd,
+            filter=select.KQ_FILTER_VNODE,
+            flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,
+            fflags=select.KQ_NOTE_WRITE | select.KQ_NOTE_EXTEND
+        )], 0)
+        
+        def close():
+            kq.close()
+            os.close(fd)
+        
+        return lambda: kq.control(None, 1), close
+    
+    return lambda: time.sleep(0.1), lambda: None
+
+
 class SesameDaemon:
     def __init__(self, app_dir: str, pid_file: str, log_file: str):
         self.app_dir = Path(app_dir).resolve()
         self.pid_file = Path(pid_file)
         self.log_file = Path(log_file)
-        self.process: Optional[subprocess.Popen] = None
         
     def is_running(self) -> bool:
-        """Check if the daemon is running."""
-        if not self.pid_file.exists():
+        """Check if the daemon is running.
+        
+        The daemon holds an exclusive flock on the PID file for its whole lifetime,
+        so the lock being free means the PID file is stale.
+        """
+        try:
+            fd = os.open(self.pid_file, os.O_RDONLY)
+        except FileNotFoundError:
             return False
             
         try:
-            pid = int(self.pid_file.read_text().strip())
-            # Check if process exists
-            os.kill(pid, 0)
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
             return True
-        except (ValueError, OSError, ProcessLookupError):
-            # Process doesn't exist, clean up PID file
+        else:
+            # Nobody holds the lock, clean up PID file
             self.pid_file.unlink(missing_ok=True)
             return False
+        finally:
+            os.close(fd)
     
     def start(self):
         """Start the SESAME web app daemon."""
@@ -57,7 +165,7 @@ class SesameDaemon:
         # Check if main.py exists
         main_script = self.app_dir / "main.py"
         if not main_script.exists():
-            logger.error(f"Main script not found: {main_script}")
+            logger.error("Main script not found: %s", main_script)
             return
             
         # Check if .env exists
@@ -67,7 +175,7 @@ class SesameDaemon:
             env_example = self.app_dir / "env.example"
             if env_example.exists():
                 env_example.copy(env_file)
-                logger.warning(f"Please edit {env_file} with your device credentials")
+                logger.warning("Please edit %s with your device credentials", env_file)
             else:
                 logger.error("env.example not found!")
                 return
@@ -76,40 +184,106 @@ class SesameDaemon:
         self.log_file.parent.mkdir(parents=True, exist_ok=True)
         
         # Start the process
-        logger.info(f"Starting SESAME Web API daemon...")
-        logger.info(f"App directory: {self.app_dir}")
-        logger.info(f"Log file: {self.log_file}")
+        logger.info("Starting SESAME Web API daemon...")
+        logger.info("App directory: %s", self.app_dir)
+        logger.info("Log file: %s", self.log_file)
+        
+        # Lock the PID file, the lock is handed over to the daemon process
+        pid_fd = os.open(self.pid_file, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(pid_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(pid_fd)
+            logger.warning("Daemon is already running!")
+            return
         
         try:
             # Open log file for writing
-            with open(self.log_file, 'w') as log_handle:
-                # Start the Python process
-                self.process = subprocess.Popen(
-                    [sys.executable, str(main_script)],
-                    cwd=self.app_dir,
-                    stdout=log_handle,
-                    stderr=subprocess.STDOUT,
-                    preexec_fn=os.setsid  # Create new process group
-                )
-                
-                # Save PID to file
-                self.pid_file.write_text(str(self.process.pid))
-                logger.info(f"Daemon started with PID: {self.process.pid}")
-                
-                # Wait a moment to check if it started successfully
-                time.sleep(2)
+            log_fd = os.open(self.log_file, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o644)
+            ready_read, ready_write = os.pipe()
+            
+            child_pid = os.fork()
+            if child_pid == 0:
+                os.close(ready_read)
+                self._daemonize(main_script, pid_fd, log_fd, ready_write)
+            
+            # The daemon keeps its own copies of these descriptors
+            os.close(ready_write)
+            os.close(log_fd)
+            os.close(pid_fd)
+            pid_fd = None
+            
+            # Reap the intermediate child, then wait for the daemon to report its PID
+            os.waitpid(child_pid, 0)
+            with os.fdopen(ready_read) as ready:
+                daemon_pid = ready.read()
+            
+            if not daemon_pid:
+                logger.error("Failed to start daemon!")
+                self.stop()
+                return
+            
+            # The PID is written right after the fork, wait until the server actually listens
+            config = get_config()
+            host, port = config.HOST, config.PORT
+            _wait_until(lambda: _port_open(host, port) or not self.is_running(), STARTUP_TIMEOUT)
+            
+            if not self.is_running():
+                logger.error("Failed to start daemon: the server exited during startup, check %s", self.log_file)
+            elif not _port_open(host, port):
+                # The server may still come up (or listen where we can't reach it), leave it running
+                logger.warning("Daemon started with PID: %s, but %s:%d is not accepting connections after %.0f seconds, check %s",
+                               daemon_pid, host, port, STARTUP_TIMEOUT, self.log_file)
+            else:
+                logger.info("Daemon started with PID: %s", daemon_pid)
+                logger.info("Daemon started successfully!")
+                self.status()
                 
-                if self.is_running():
-                    logger.info("Daemon started successfully!")
-                    self.status()
-                else:
-                    logger.error("Failed to start daemon!")
-                    self.stop()
-                    
         except Exception as e:
-            logger.error(f"Error starting daemon: {e}")
+            logger.error("Error starting daemon: %s", e)
+            if pid_fd is not None:
+                os.close(pid_fd)
             self.stop()
     
+    def _daemonize(self, main_script: Path, pid_fd: int, log_fd: int, ready_fd: int):
+        """Detach with a double fork and run main.py in this interpreter. Never returns."""
+        exit_code = 1
+        try:
+            os.setsid()
+            if os.fork() > 0:
+                os._exit(0)
+            
+            # Redirect stdio to the log file
+            os.chdir(self.app_dir)
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.dup2(log_fd, 1)
+            os.dup2(log_fd, 2)
+            os.close(devnull)
+            os.close(log_fd)
+            
+            # Save PID to the locked PID file and report it to the parent
+            pid = str(os.getpid()).encode()
+            os.ftruncate(pid_fd, 0)
+            os.write(pid_fd, pid)
+            os.write(ready_fd, pid)
+            os.close(ready_fd)
+            
+            # Run the server as `python main.py` would, reusing the modules imported so far
+            sys.argv = [str(main_script)]
+            sys.path.insert(0, str(self.app_dir))
+            runpy.run_path(str(main_script), run_name="__main__")
+            exit_code = 0
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            logging.shutdown()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+    
     def stop(self):
         """Stop the SESAME web app daemon."""
         if not self.is_running():
@@ -118,22 +292,17 @@ class SesameDaemon:
             
         try:
             pid = int(self.pid_file.read_text().strip())
-            logger.info(f"Stopping daemon (PID: {pid})...")
+            logger.info("Stopping daemon (PID: %d)...", pid)
             
             # Try graceful shutdown
             os.kill(pid, signal.SIGTERM)
             
             # Wait for graceful shutdown
-            for i in range(10):
-                if not self.is_running():
-                    break
-                time.sleep(1)
-            
-            # Force kill if still running
-            if self.is_running():
+            if not _wait_for_exit(pid, 10.0):
+                # Force kill if still running
                 logger.warning("Force killing daemon...")
                 os.kill(pid, signal.SIGKILL)
-                time.sleep(1)
+                _wait_for_exit(pid, 1.0)
             
             # Clean up PID file
             self.pid_file.unlink(missing_ok=True)
@@ -144,33 +313,27 @@ class SesameDaemon:
                 logger.error("Failed to stop daemon!")
                 
         except Exception as e:
-            logger.error(f"Error stopping daemon: {e}")
+            logger.error("Error stopping daemon: %s", e)
     
     def restart(self):
         """Restart the SESAME web app daemon."""
         logger.info("Restarting daemon...")
         self.stop()
-        time.sleep(2)
         self.start()
     
     def status(self):
         """Show daemon status."""
         if self.is_running():
             pid = int(self.pid_file.read_text().strip())
-            logger.info(f"✓ Daemon is RUNNING (PID: {pid})")
-            logger.info(f"  PID file: {self.pid_file}")
-            logger.info(f"  Log file: {self.log_file}")
-            logger.info(f"  App dir: {self.app_dir}")
+            logger.info("✓ Daemon is RUNNING (PID: %d)", pid)
+            logger.info("  PID file: %s", self.pid_file)
+            logger.info("  Log file: %s", self.log_file)
+            logger.info("  App dir: %s", self.app_dir)
             
-            # Check if API is responding
-            try:
-                import requests
-                response = requests.get("http://localhost:8000/health", timeout=5)
-                if response.status_code == 200:
-                    logger.info("  API: ✓ Responding")
-                else:
-                    logger.warning("  API: ⚠ Not responding properly")
-            except:
+            # Check if API is accepting connections
+            if _port_open(get_config().HOST, get_config().PORT):
+                logger.info("  API: ✓ Responding")
+            else:
                 logger.warning("  API: ⚠ Not responding")
         else:
             logger.info("✗ Daemon is STOPPED")
@@ -178,7 +341,7 @@ class SesameDaemon:
     def logs(self, follow: bool = False):
         """Show daemon logs."""
         if not self.log_file.exists():
-            logger.warning(f"No log file found: {self.log_file}")
+            logger.warning("No log file found: %s", self.log_file)
             return
             
         if follow:
@@ -188,23 +351,33 @@ class SesameDaemon:
                 with open(self.log_file, 'r') as f:
                     # Go to end of file
                     f.seek(0, 2)
-                    while True:
-                        line = f.readline()
-                        if line:
-                            print(line.rstrip())
-                        else:
-                            time.sleep(0.1)
+                    wait_for_change, close_waiter = _file_change_waiter(self.log_file)
+                    try:
+                        while True:
+                            line = f.readline()
+                            if line:
+                                print(line.rstrip())
+                            else:
+                                wait_for_change()
+                    finally:
+                        close_waiter()
             except KeyboardInterrupt:
                 logger.info("Log viewing stopped")
         else:
             logger.info("Recent logs:")
             try:
-                with open(self.log_file, 'r') as f:
-                    lines = f.readlines()
-                    for line in lines[-50:]:  # Last 50 lines
-                        print(line.rstrip())
+                with open(self.log_file, 'rb') as f:
+                    # Only read the tail of the file, whatever its size
+                    size = f.seek(0, os.SEEK_END)
+                    offset = max(0, size - TAIL_BLOCK_SIZE)
+                    f.seek(offset)
+                    if offset:
+                        f.readline()  # Skip the partial first line
+                    lines = deque(f, maxlen=TAIL_LINES)
+                for line in lines:
+                    print(line.decode(errors='replace').rstrip())
             except Exception as e:
-                logger.error(f"Error reading logs: {e}")
+                logger.error("Error reading logs: %s", e)
 
 def main():
     parser = argparse.ArgumentParser(description="SESAME Web API Daemon")
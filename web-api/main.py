@@ -3,69 +3,103 @@ SESAME Web API Server with Connection Pooling
 A FastAPI web server that provides REST endpoints to control SESAME smart locks with persistent connections.
 """
 
+from __future__ import annotations
+
 import asyncio
+import contextlib
+import functools
 import logging
-import os
 import time
+from contextlib import asynccontextmanager
 from typing import Dict, Any, Optional, Union
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+import orjson
+from fastapi import FastAPI, HTTPException
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel
-from dotenv import load_dotenv
-load_dotenv()
-
-# Import SESAME library modules
-import sys
-sys.path.append('..')  # Add parent directory to path to import pysesameos2
+from config import get_config
 
-from pysesameos2.ble import CHBleManager
+# Import SESAME library modules (pysesameos2 is installed from requirements.txt)
+from bleak.exc import BleakError
+from pysesameos2.ble import BLEAdvertisement, CHBleManager
+from pysesameos2.const import CHSesame2Status
 from pysesameos2.device import CHDeviceKey
 from pysesameos2.helper import CHProductModel
 from pysesameos2.chsesame2 import CHSesame2
 from pysesameos2.chsesamebot import CHSesameBot
 
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configuration, read from the environment (and .env) once
+config = get_config()
+BLE_UUID = config.BLE_UUID
+SECRET_KEY = config.SECRET_KEY
+PUBLIC_KEY = config.PUBLIC_KEY
+SCAN_DURATION = config.SCAN_DURATION
+CONNECTION_TIMEOUT = config.CONNECTION_TIMEOUT
+MAX_RECONNECT_ATTEMPTS = config.MAX_RECONNECT_ATTEMPTS
+DEVICE_CACHE_TTL = config.DEVICE_CACHE_TTL
+# Refresh the persistent session this long before CONNECTION_TIMEOUT; capped at half
+# the timeout, or a short timeout would put every new session past its refresh deadline
+CONNECTION_REFRESH_MARGIN = min(60, CONNECTION_TIMEOUT / 2)
+# How often the keepalive task checks that an idle link is still up
+KEEPALIVE_INTERVAL = 60
+
+# Configure logging (force=True so a re-import doesn't stack handlers)
+_log_level = logging.getLevelName(config.LOG_LEVEL.upper())
+logging.basicConfig(level=_log_level if isinstance(_log_level, int) else logging.INFO, force=True)
 logging.getLogger("bleak").setLevel(level=logging.WARNING)
 logger = logging.getLogger(__name__)
+if not isinstance(_log_level, int):
+    logger.warning("Unknown LOG_LEVEL %r, logging at INFO", config.LOG_LEVEL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect in the background and run the worker tasks for the server's lifetime."""
+    tasks = [
+        asyncio.create_task(keepalive_loop()),
+        asyncio.create_task(device_worker()),
+    ]
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await connection_manager.close()
 
-# Configuration from environment variables
-BLE_UUID = os.getenv("SESAME_BLE_UUID", "")
-SECRET_KEY = os.getenv("SESAME_SECRET_KEY", "")
-PUBLIC_KEY = os.getenv("SESAME_PUBLIC_KEY", "")
-SCAN_DURATION = int(os.getenv("SESAME_SCAN_DURATION", "15"))
-CONNECTION_TIMEOUT = int(os.getenv("SESAME_CONNECTION_TIMEOUT", "1800"))  # 30 minutes in seconds
-MAX_RECONNECT_ATTEMPTS = int(os.getenv("SESAME_MAX_RECONNECT_ATTEMPTS", "5"))
 
 # FastAPI app
 app = FastAPI(
     title="SESAME Web API",
     description="REST API for controlling SESAME smart locks",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
+# Only the endpoint listing on / exceeds 500 bytes; status and command results stay uncompressed
+app.add_middleware(GZipMiddleware, minimum_size=500)
 
 # Response models
 class ToggleResponse(BaseModel):
     success: bool
     message: str
-    device_id: str = None
-    product_model: str = None
-    device_status: str = None
+    device_id: Optional[str] = None
+    product_model: Optional[str] = None
+    device_status: Optional[str] = None
     connection_reused: bool = False
     reconnect_attempts: int = 0
 
 class StatusResponse(BaseModel):
     success: bool
     message: str
-    device_id: str = None
-    product_model: str = None
-    device_status: str = None
-    battery_percentage: int = None
-    battery_voltage: float = None
-    is_in_lock_range: bool = None
-    is_in_unlock_range: bool = None
-    position: int = None
+    device_id: Optional[str] = None
+    product_model: Optional[str] = None
+    device_status: Optional[str] = None
+    battery_percentage: Optional[int] = None
+    battery_voltage: Optional[float] = None
+    is_in_lock_range: Optional[bool] = None
+    is_in_unlock_range: Optional[bool] = None
+    position: Optional[int] = None
 
 class ConnectionResponse(BaseModel):
     success: bool
@@ -77,25 +111,84 @@ class ConnectionResponse(BaseModel):
     connection_time: str | None = None
 
 
-# Global connection manager
+# Scan results by BLE UUID: (scanned_at, device, advertisement)
+_device_cache: Dict[str, tuple[float, Union[CHSesame2, CHSesameBot], BLEAdvertisement]] = {}
+_device_lock = asyncio.Lock()
+
+
+def evict_cached_device(ble_uuid: str):
+    """Drop a cached scan result so the next lookup rescans."""
+    _device_cache.pop(ble_uuid, None)
+
+
+@functools.lru_cache(maxsize=None)
+def _model_fields(model: type[BaseModel]) -> tuple[tuple[str, ...], tuple[tuple[str, Any], ...]]:
+    """Required field names of a response model, and the optional ones with their defaults."""
+    required = tuple(name for name, field in model.model_fields.items() if field.is_required())
+    optional = tuple((name, field.default) for name, field in model.model_fields.items() if not field.is_required())
+    return required, optional
+
+
+def model_response(model: type[BaseModel], data: Dict[str, Any]) -> ORJSONResponse:
+    """Shape data like a response model and serialize it with orjson.
+    
+    The models only document the responses; the values come from our own code,
+    so they are not validated again on every request.
+    """
+    required, optional = _model_fields(model)
+    missing = [name for name in required if name not in data]
+    if missing:
+        raise ValueError(f"{model.__name__} is missing required fields: {', '.join(missing)}")
+    content = {name: data[name] for name in required}
+    content.update((name, data.get(name, default)) for name, default in optional)
+    return ORJSONResponse(content)
+
+
 class SesameConnectionManager:
-    def __init__(self):
+    """Persistent BLE session to a single SESAME device."""
+    
+    def __init__(
+        self,
+        ble_uuid: str = BLE_UUID,
+        secret_key: str = SECRET_KEY,
+        public_key: str = PUBLIC_KEY
+    ):
+        self.ble_uuid = ble_uuid
+        self.secret_key = secret_key
+        self.public_key = public_key
         self.device: Optional[Union[CHSesame2, CHSesameBot]] = None
+        # Identity strings, computed once when the device is acquired
+        self.device_id: Optional[str] = None
+        self.product_model: Optional[str] = None
+        # Monotonic, for expiry; the wall-clock time is only kept for display
         self.connection_time: Optional[float] = None
+        self.connected_at_wall: Optional[float] = None
+        # Monotonic deadline of the session, 0.0 while disconnected
+        self._expires_at: float = 0.0
+        # connected_at_wall as shown by the API, formatted once per connection
+        self.connection_time_str: Optional[str] = None
         self.is_connected: bool = False
+        # Bumped on every successful connect, so callers can tell their session from a newer one
+        self.generation: int = 0
         self.connection_lock = asyncio.Lock()
+        self.reconnect_needed = asyncio.Event()
+        # Connect in progress, awaited by every caller that finds no live session meanwhile
+        self._connecting: Optional[asyncio.Future] = None
     
-    def is_connection_valid(self) -> bool:
-        """Check if the current connection is still valid and within timeout."""
-        if not self.is_connected or not self.connection_time:
-            return False
+    def validate(self):
+        """Check that the device's address and keys are set."""
+        if not self.ble_uuid:
+            raise ValueError("A BLE UUID is required to connect to the device")
         
-        # Check if connection has expired
-        if time.time() - self.connection_time > CONNECTION_TIMEOUT:
-            logger.info("Connection has expired, will reconnect")
-            return False
+        if not self.secret_key:
+            raise ValueError(f"A secret key is required for device {self.ble_uuid}")
         
-        return True
+        if not self.public_key:
+            raise ValueError(f"A public key is required for device {self.ble_uuid}")
+    
+    def _fast_check(self) -> bool:
+        """Check for a live, unexpired connection without taking the lock or yielding."""
+        return self.is_connected and time.monotonic() < self._expires_at
     
     async def test_connection(self) -> bool:
         """Test if the current connection is actually working by trying to get device status."""
@@ -105,19 +198,19 @@ class SesameConnectionManager:
         try:
             # Try to get device status - this will fail if connection is broken
             device_status = self.device.getDeviceStatus()
-            logger.debug(f"Connection test successful, device status: {device_status}")
+            logger.debug("Connection test successful, device status: %s", device_status)
             return True
         except Exception as e:
-            logger.warning(f"Connection test failed: {str(e)}")
+            logger.warning("Connection test failed: %s", e)
             return False
     
     async def is_connection_valid(self) -> bool:
         """Check if the current connection is still valid and actually working."""
-        if not self.is_connected or not self.connection_time:
+        if not self.is_connected:
             return False
         
         # Check if connection has expired
-        if time.time() - self.connection_time > CONNECTION_TIMEOUT:
+        if time.monotonic() >= self._expires_at:
             logger.info("Connection has expired, will reconnect")
             return False
         
@@ -128,38 +221,100 @@ class SesameConnectionManager:
         
         return True
     
+    def _on_device_status_changed(self, device: Union[CHSesame2, CHSesameBot]):
+        """Flag a reconnect when an established BLE link drops."""
+        if self.is_connected and device.getDeviceStatus() == CHSesame2Status.NoBleSignal:
+            logger.warning("Device connection lost")
+            self.is_connected = False
+            self.connection_time = None
+            self._expires_at = 0.0
+            self.connected_at_wall = None
+            self.connection_time_str = None
+            # Go through the scan cache again, it restores the advertisement dropped on disconnect
+            self.device = None
+            self.reconnect_needed.set()
+    
+    async def _close_link(self):
+        """Tear down a possibly half-open BLE link and forget the device.
+
+        Callers must hold connection_lock.
+        """
+        device = self.device
+        self.is_connected = False
+        self.connection_time = None
+        self._expires_at = 0.0
+        self.connected_at_wall = None
+        self.connection_time_str = None
+        self.device = None
+        invalidate_status_cache()
+        if device is not None:
+            # We are already recovering, the drop must not queue another reconnect
+            device.setDeviceStatusCallback(None)
+            with contextlib.suppress(Exception):
+                await device.disconnect()
+    
+    def renew_scan_result(self):
+        """Mark the cached scan result fresh; a live link shows its address is still current."""
+        cached = _device_cache.get(self.ble_uuid)
+        if cached:
+            _device_cache[self.ble_uuid] = (time.monotonic(), *cached[1:])
+    
+    async def reset_connection(self, generation: Optional[int] = None):
+        """Close the current link so the next ensure_connection() starts fresh.
+        
+        With a generation, only close it if no newer session has replaced that one.
+        """
+        async with self.connection_lock:
+            if generation is not None and generation != self.generation:
+                logger.info("Session already replaced, keeping the new connection")
+                return
+            await self._close_link()
+    
     async def get_or_create_device(self) -> Union[CHSesame2, CHSesameBot]:
         """Get existing device instance or create a new one."""
         if not self.device:
             self.device = await self._create_device_instance()
+            self.device_id = self.device.getDeviceUUID()
+            self.product_model = str(self.device.productModel)
+            self.device.setDeviceStatusCallback(self._on_device_status_changed)
         return self.device
     
     async def _create_device_instance(self) -> Union[CHSesame2, CHSesameBot]:
         """Create a new device instance."""
-        if not BLE_UUID:
-            raise ValueError("SESAME_BLE_UUID environment variable not set")
-        
-        if not SECRET_KEY or not PUBLIC_KEY:
-            raise ValueError("SESAME_SECRET_KEY and SESAME_PUBLIC_KEY environment variables must be set")
-        
-        logger.info(f"Scanning for device: {BLE_UUID}")
-        
-        # Scan for the specific device
-        device = await CHBleManager().scan_by_address(
-            ble_device_identifier=BLE_UUID, 
-            scan_duration=SCAN_DURATION
-        )
-        
-        if not device:
-            raise RuntimeError(f"Device {BLE_UUID} not found during scan")
-        
-        # Set up device keys
-        device_key = CHDeviceKey()
-        device_key.setSecretKey(SECRET_KEY)
-        device_key.setSesame2PublicKey(PUBLIC_KEY)
-        device.setKey(device_key)
+        self.validate()
+        
+        async with _device_lock:
+            cached = _device_cache.get(self.ble_uuid)
+            if cached:
+                scanned_at, device, advertisement = cached
+                if time.monotonic() - scanned_at <= DEVICE_CACHE_TTL:
+                    # The advertisement is dropped on BLE disconnect; restore it so connect() works
+                    if device.getAdvertisement() is None:
+                        device.setAdvertisement(advertisement)
+                    logger.info("Using cached scan result for device: %s", self.ble_uuid)
+                    return device
+                evict_cached_device(self.ble_uuid)
+            
+            logger.info("Scanning for device: %s", self.ble_uuid)
+            
+            # Scan for the specific device
+            device = await CHBleManager().scan_by_address(
+                ble_device_identifier=self.ble_uuid, 
+                scan_duration=SCAN_DURATION
+            )
+            
+            if not device:
+                raise RuntimeError(f"Device {self.ble_uuid} not found during scan")
+            
+            # Set up device keys
+            device_key = CHDeviceKey()
+            device_key.setSecretKey(self.secret_key)
+            device_key.setSesame2PublicKey(self.public_key)
+            device.setKey(device_key)
+            
+            _device_cache[self.ble_uuid] = (time.monotonic(), device, device.getAdvertisement())
         
-        logger.info(f"Device found: {device.getDeviceUUID()}, Model: {device.productModel}")
+        logger.info("Device found: %s, Model: %s", device.getDeviceUUID(), device.productModel)
         return device
     
     async def ensure_connection(self, max_attempts: int = MAX_RECONNECT_ATTEMPTS) -> tuple[bool, bool]:
@@ -168,64 +323,118 @@ class SesameConnectionManager:
         Returns:
             tuple: (success: bool, connection_reused: bool)
         """
-        async with self.connection_lock:
-            attempts = 0
-            
-            while attempts < max_attempts:
-                try:
-                    # Check if we have a valid connection
-                    if await self.is_connection_valid():
-                        logger.info("Using existing connection")
-                        return True, True  # success, reused
-                    
-                    # Get or create device
-                    device = await self.get_or_create_device()
-                    
-                    # Connect to device
-                    logger.info(f"Connecting to device (attempt {attempts + 1}/{max_attempts})...")
-                    await device.connect()
-                    
-                    # Wait for login to complete
-                    await device.wait_for_login()
-                    
-                    # Update connection state
-                    self.is_connected = True
-                    self.connection_time = time.time()
-                    
-                    logger.info("Device connected and authenticated successfully")
-                    return True, False  # success, not reused
-                    
-                except Exception as e:
-                    attempts += 1
-                    logger.error(f"Connection attempt {attempts} failed: {str(e)}")
-                    
-                    # Reset connection state
-                    self.is_connected = False
-                    self.connection_time = None
-                    
-                    if attempts < max_attempts:
-                        logger.info(f"Retrying in 2 seconds...")
-                        await asyncio.sleep(2)
-                    else:
-                        logger.error(f"Failed to connect after {max_attempts} attempts")
-                        return False, False  # failed, not reused
-            
-            return False, False
+        # Hot path: an established session needs neither the lock nor an await
+        if self._fast_check():
+            logger.info("Using existing connection")
+            return True, True  # success, reused
+        
+        # Share one connect (and its outcome) instead of retrying it once per caller
+        if self._connecting is None:
+            self._connecting = asyncio.ensure_future(self._slow_connect(max_attempts))
+        # Shielded so a cancelled request does not abort the connect for the other waiters
+        return await asyncio.shield(self._connecting)
+    
+    async def _slow_connect(self, max_attempts: int) -> tuple[bool, bool]:
+        """(Re)connect under connection_lock, rechecking once the lock is held."""
+        try:
+            async with self.connection_lock:
+                attempts = 0
+                
+                while attempts < max_attempts:
+                    try:
+                        # Check if we have a valid connection
+                        if await self.is_connection_valid():
+                            logger.info("Using existing connection")
+                            return True, True  # success, reused
+                        
+                        # An expired session is still open, close it before connecting again
+                        if self.is_connected:
+                            await self._close_link()
+                        
+                        # Get or create device
+                        device = await self.get_or_create_device()
+                        
+                        # Connect to device
+                        logger.info("Connecting to device (attempt %d/%d)...", attempts + 1, max_attempts)
+                        await device.connect()
+                        
+                        # Wait for login to complete
+                        await device.wait_for_login()
+                        
+                        # Update connection state
+                        self.is_connected = True
+                        self.generation += 1
+                        self.connection_time = time.monotonic()
+                        self._expires_at = self.connection_time + CONNECTION_TIMEOUT
+                        self.connected_at_wall = time.time()
+                        self.connection_time_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.connected_at_wall))
+                        
+                        logger.info("Device connected and authenticated successfully")
+                        return True, False  # success, not reused
+                        
+                    except Exception as e:
+                        attempts += 1
+                        logger.error("Connection attempt %d failed: %s", attempts, e)
+                        
+                        # Don't leave a half-open link behind for the next attempt
+                        await self._close_link()
+                        
+                        # The cached scan result may be stale, rescan on the next attempt
+                        if isinstance(e, BleakError):
+                            evict_cached_device(self.ble_uuid)
+                        
+                        if attempts < max_attempts:
+                            logger.info("Retrying in 2 seconds...")
+                            await asyncio.sleep(2)
+                        else:
+                            logger.error("Failed to connect after %d attempts", max_attempts)
+                            return False, False  # failed, not reused
+                
+                return False, False
+        finally:
+            self._connecting = None
+    
+    async def close(self):
+        """Shut the manager down, without waiting for scans and connect retries."""
+        if self._connecting is not None:
+            self._connecting.cancel()
+        await self.disconnect()
     
     async def disconnect(self):
         """Disconnect the current device."""
         async with self.connection_lock:
             if self.device and self.is_connected:
                 try:
+                    # A manual disconnect should not trigger a reconnect
+                    self.device.setDeviceStatusCallback(None)
                     await self.device.disconnect()
                     logger.info("Device disconnected")
                 except Exception as e:
-                    logger.error(f"Error disconnecting device: {str(e)}")
+                    logger.error("Error disconnecting device: %s", e)
                 finally:
                     self.is_connected = False
                     self.connection_time = None
+                    self._expires_at = 0.0
+                    self.connected_at_wall = None
+                    self.connection_time_str = None
                     # Clear the device reference after disconnecting
                     self.device = None
+                    invalidate_status_cache()
+    
+    def link_alive(self) -> bool:
+        """Ask the BLE client whether the link is really up.
+        
+        The device status only changes on bleak's disconnect callback, this
+        also catches drops that were never reported.
+        """
+        client = getattr(self.device, "_client", None)
+        return client is not None and client.is_connected
+    
+    def seconds_until_refresh(self) -> Optional[float]:
+        """Time left before the session should be refreshed, None when not connected."""
+        if not self.is_connected:
+            return None
+        return self._expires_at - CONNECTION_REFRESH_MARGIN - time.monotonic()
     
     def get_device_info(self) -> Dict[str, Any]:
         """Get current device information."""
@@ -233,15 +442,59 @@ class SesameConnectionManager:
             return {}
         
         return {
-            "device_id": self.device.getDeviceUUID(),
-            "product_model": str(self.device.productModel),
+            "device_id": self.device_id,
+            "product_model": self.product_model,
             "is_connected": self.is_connected,
-            "connection_time": self.connection_time,
-            "connection_age": time.time() - self.connection_time if self.connection_time else None
+            "connection_time": self.connected_at_wall,
+            "connection_age": time.monotonic() - self.connection_time if self.connection_time else None
         }
+    
+    def build_status(self, device: Union[CHSesame2, CHSesameBot]) -> Dict[str, Any]:
+        """Collect the device identity, device status and mechanical status into a plain dict.
+        
+        Takes the device the caller worked with: a BLE drop meanwhile clears self.device.
+        """
+        # Both getters return state cached from the last BLE notification, no radio round-trip
+        mech_status = device.getMechStatus()
+        status = {
+            "device_id": self.device_id,
+            "product_model": self.product_model,
+            "device_status": str(device.getDeviceStatus())
+        }
+        
+        # Add mechanical status if available
+        if mech_status:
+            status.update({
+                "battery_percentage": mech_status.getBatteryPrecentage(),
+                "battery_voltage": mech_status.getBatteryVoltage(),
+                "is_in_lock_range": mech_status.isInLockRange(),
+                "is_in_unlock_range": mech_status.isInUnlockRange()
+            })
+            
+            # Add position for SESAME 2/4
+            if hasattr(mech_status, 'getPosition'):
+                status["position"] = mech_status.getPosition()
+        
+        return status
+
+# Global connection manager instance, for the configured device
+connection_manager = SesameConnectionManager(BLE_UUID, SECRET_KEY, PUBLIC_KEY)
+
+# Device operations, consumed by a single worker so commands never race on the radio
+op_queue: asyncio.Queue[tuple[str, str, asyncio.Future]] = asyncio.Queue()
+# Held by the worker while a command runs, so the keepalive never closes the session under it
+op_lock = asyncio.Lock()
+
+# Last status built for /status: (built_at, status)
+STATUS_CACHE_TTL = 1.0
+_status_cache: Optional[tuple[float, Dict[str, Any]]] = None
+
+
+def invalidate_status_cache():
+    """Drop the cached /status result, e.g. after the lock has moved."""
+    global _status_cache
+    _status_cache = None
 
-# Global connection manager instance
-connection_manager = SesameConnectionManager()
 
 async def get_device_instance():
     """
@@ -251,6 +504,55 @@ async def get_device_instance():
     return await connection_manager.get_or_create_device()
 
 
+# Device method for each (product, operation) pair the API accepts
+_DISPATCH = {
+    (CHProductModel.SS2, "toggle"): "toggle",
+    (CHProductModel.SS2, "lock"): "lock",
+    (CHProductModel.SS2, "unlock"): "unlock",
+    (CHProductModel.SS4, "toggle"): "toggle",
+    (CHProductModel.SS4, "lock"): "lock",
+    (CHProductModel.SS4, "unlock"): "unlock",
+    (CHProductModel.SesameBot1, "click"): "click",
+}
+
+# Product names used in error messages
+_MODEL_NAMES = {
+    CHProductModel.SS2: "SESAME 2/4",
+    CHProductModel.SS4: "SESAME 2/4",
+    CHProductModel.SesameBot1: "SESAME Bot",
+}
+
+
+async def _dispatch(device: Union[CHSesame2, CHSesameBot], operation: str, history_tag: str):
+    """Run a lock/bot command on the device, rejecting ones its model doesn't support."""
+    method_name = _DISPATCH.get((device.productModel, operation))
+    if method_name is None:
+        name = _MODEL_NAMES.get(device.productModel)
+        if name is None:
+            raise ValueError(f"Unsupported device model: {device.productModel}")
+        raise ValueError(f"Operation '{operation}' not supported for {name}")
+    
+    await getattr(device, method_name)(history_tag=history_tag)
+    invalidate_status_cache()
+
+
+def _build_result(
+    device: Union[CHSesame2, CHSesameBot],
+    operation: str,
+    connection_reused: bool,
+    reconnect_attempts: int,
+    extra_msg: str = ""
+) -> Dict[str, Any]:
+    """Result of a successful operation, including a fresh device status."""
+    return {
+        "success": True,
+        "message": f"Operation '{operation}' completed successfully{extra_msg}",
+        "connection_reused": connection_reused,
+        "reconnect_attempts": reconnect_attempts,
+        **connection_manager.build_status(device)
+    }
+
+
 async def perform_device_operation(operation: str, history_tag: str = "Web API"):
     """
     Perform an operation on the SESAME device using connection pooling.
@@ -264,12 +566,15 @@ async def perform_device_operation(operation: str, history_tag: str = "Web API")
     """
     connection_reused = False
     reconnect_attempts = 0
+    # Session the command runs on, None until connected
+    generation: Optional[int] = None
     
     try:
         # Ensure we have a valid connection (this handles both validation and connection)
         success, connection_reused = await connection_manager.ensure_connection()
         if not success:
             raise RuntimeError("Failed to establish connection to device")
+        generation = connection_manager.generation
         
         if connection_reused:
             logger.info("Using existing connection for operation")
@@ -277,111 +582,38 @@ async def perform_device_operation(operation: str, history_tag: str = "Web API")
             logger.info("Established new connection for operation")
             reconnect_attempts = 1
         
-        # Get the connected device
+        # Hold on to the device, a BLE drop during the command clears connection_manager.device
         device = connection_manager.device
-        
-        # Perform the requested operation
-        if device.productModel in [CHProductModel.SS2, CHProductModel.SS4]:
-            if operation == "toggle":
-                await device.toggle(history_tag=history_tag)
-            elif operation == "lock":
-                await device.lock(history_tag=history_tag)
-            elif operation == "unlock":
-                await device.unlock(history_tag=history_tag)
-            else:
-                raise ValueError(f"Operation '{operation}' not supported for SESAME 2/4")
-                
-        elif device.productModel == CHProductModel.SesameBot1:
-            if operation == "click":
-                await device.click(history_tag=history_tag)
-            else:
-                raise ValueError(f"Operation '{operation}' not supported for SESAME Bot")
-        
-        # Get device status
-        mech_status = device.getMechStatus()
-        device_status = device.getDeviceStatus()
-        
-        result = {
-            "success": True,
-            "message": f"Operation '{operation}' completed successfully",
-            "device_id": device.getDeviceUUID(),
-            "product_model": str(device.productModel),
-            "device_status": str(device_status),
-            "connection_reused": connection_reused,
-            "reconnect_attempts": reconnect_attempts
-        }
-        
-        # Add mechanical status if available
-        if mech_status:
-            result.update({
-                "battery_percentage": mech_status.getBatteryPrecentage(),
-                "battery_voltage": mech_status.getBatteryVoltage(),
-                "is_in_lock_range": mech_status.isInLockRange(),
-                "is_in_unlock_range": mech_status.isInUnlockRange()
-            })
-            
-            # Add position for SESAME 2/4
-            if hasattr(mech_status, 'getPosition'):
-                result["position"] = mech_status.getPosition()
-        
-        return result
+        await _dispatch(device, operation, history_tag)
+        return _build_result(device, operation, connection_reused, reconnect_attempts)
         
     except Exception as e:
-        logger.error(f"Error performing operation '{operation}': {str(e)}")
-        
-        # If operation failed, try to reconnect and retry once
-        if not connection_reused and reconnect_attempts < MAX_RECONNECT_ATTEMPTS:
-            logger.info("Operation failed, attempting to reconnect and retry...")
-            try:
-                # Reset connection and try again
-                connection_manager.is_connected = False
-                connection_manager.connection_time = None
-                
-                success, _ = await connection_manager.ensure_connection()
-                if success:
-                    # Retry the operation
-                    device = connection_manager.device
-                    
-                    if device.productModel in [CHProductModel.SS2, CHProductModel.SS4]:
-                        if operation == "toggle":
-                            await device.toggle(history_tag=history_tag)
-                        elif operation == "lock":
-                            await device.lock(history_tag=history_tag)
-                        elif operation == "unlock":
-                            await device.unlock(history_tag=history_tag)
-                    elif device.productModel == CHProductModel.SesameBot1:
-                        if operation == "click":
-                            await device.click(history_tag=history_tag)
-                    
-                    # Get updated status
-                    mech_status = device.getMechStatus()
-                    device_status = device.getDeviceStatus()
-                    
-                    result = {
-                        "success": True,
-                        "message": f"Operation '{operation}' completed successfully after reconnection",
-                        "device_id": device.getDeviceUUID(),
-                        "product_model": str(device.productModel),
-                        "device_status": str(device_status),
-                        "connection_reused": False,
-                        "reconnect_attempts": reconnect_attempts + 1
-                    }
-                    
-                    if mech_status:
-                        result.update({
-                            "battery_percentage": mech_status.getBatteryPrecentage(),
-                            "battery_voltage": mech_status.getBatteryVoltage(),
-                            "is_in_lock_range": mech_status.isInLockRange(),
-                            "is_in_unlock_range": mech_status.isInUnlockRange()
-                        })
+        logger.error("Error performing operation '%s': %s", operation, e)
+        
+        # An unsupported operation says nothing about the link, keep the session
+        if not isinstance(e, ValueError):
+            # Never hand a session that just failed a command to the next request,
+            # but leave one the keepalive has opened since the failure alone
+            if generation is not None:
+                await connection_manager.reset_connection(generation)
+            
+            # Reconnect and retry once, whether the failed session was new or reused
+            if reconnect_attempts < MAX_RECONNECT_ATTEMPTS:
+                logger.info("Operation failed, attempting to reconnect and retry...")
+                try:
+                    success, _ = await connection_manager.ensure_connection()
+                    if success:
+                        device = connection_manager.device
+                        generation = connection_manager.generation
+                        try:
+                            await _dispatch(device, operation, history_tag)
+                        except Exception:
+                            await connection_manager.reset_connection(generation)
+                            raise
+                        return _build_result(device, operation, False, reconnect_attempts + 1, " after reconnection")
                         
-                        if hasattr(mech_status, 'getPosition'):
-                            result["position"] = mech_status.getPosition()
-                    
-                    return result
-                    
-            except Exception as retry_error:
-                logger.error(f"Retry attempt also failed: {str(retry_error)}")
+                except Exception as retry_error:
+                    logger.error("Retry attempt also failed: %s", retry_error)
         
         return {
             "success": False,
@@ -391,147 +623,200 @@ async def perform_device_operation(operation: str, history_tag: str = "Web API")
         }
 
 
+async def keepalive_loop():
+    """Keep a persistent session to the device.
+    
+    Scans and connects at startup, reconnects whenever the link drops and
+    refreshes the session shortly before CONNECTION_TIMEOUT would expire it,
+    so requests never pay for a scan or a reconnect themselves. Every
+    KEEPALIVE_INTERVAL it also checks the link itself, in case a drop was
+    never reported.
+    """
+    success, _ = await connection_manager.ensure_connection()
+    if not success:
+        logger.warning("Initial connection failed, will connect on the next request")
+    
+    while True:
+        # Sessions opened by requests meanwhile are picked up on the next wake-up
+        remaining = connection_manager.seconds_until_refresh()
+        timeout = KEEPALIVE_INTERVAL if remaining is None else min(max(remaining, 1.0), KEEPALIVE_INTERVAL)
+        try:
+            await asyncio.wait_for(connection_manager.reconnect_needed.wait(), timeout=timeout)
+            connection_manager.reconnect_needed.clear()
+            logger.info("Re-establishing connection to device...")
+        except asyncio.TimeoutError:
+            async with op_lock:
+                remaining = connection_manager.seconds_until_refresh()
+                if remaining is None:
+                    continue
+                if remaining <= 0:
+                    logger.info("Refreshing connection before it expires...")
+                    # Reconnect from the scan result instead of going offline for a rescan
+                    connection_manager.renew_scan_result()
+                elif not connection_manager.link_alive():
+                    logger.warning("BLE link lost without a disconnect event, reconnecting...")
+                else:
+                    continue
+                await connection_manager.reset_connection()
+                await connection_manager.ensure_connection()
+            continue
+        await connection_manager.ensure_connection()
+
+
+async def device_worker():
+    """Run queued device operations one at a time on the shared connection."""
+    while True:
+        operation, history_tag, future = await op_queue.get()
+        try:
+            if not future.cancelled():
+                async with op_lock:
+                    result = await perform_device_operation(operation, history_tag)
+                if not future.cancelled():
+                    future.set_result(result)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            op_queue.task_done()
+
+
+async def submit_device_operation(operation: str, history_tag: str = "Web API") -> Dict[str, Any]:
+    """Queue an operation for the device worker and wait for its result."""
+    future = asyncio.get_running_loop().create_future()
+    await op_queue.put((operation, history_tag, future))
+    return await future
+
+
+# Neither payload changes while the server runs, so both are encoded once
+_ROOT_BYTES = orjson.dumps({
+    "message": "SESAME Web API with Connection Pooling",
+    "version": "2.0.0",
+    "features": {
+        "connection_pooling": True,
+        "auto_reconnection": True,
+        "persistent_connections": True
+    },
+    "endpoints": {
+        "/toggle": "Toggle the SESAME lock (with connection pooling)",
+        "/lock": "Lock the SESAME device",
+        "/unlock": "Unlock the SESAME device", 
+        "/click": "Click the SESAME Bot",
+        "/status": "Get device status",
+        "/connect": "Manually establish connection",
+        "/disconnect": "Manually disconnect",
+        "/connection": "Get connection status",
+        "/health": "Health check"
+    },
+    "configuration": {
+        "connection_timeout": f"{CONNECTION_TIMEOUT} seconds ({CONNECTION_TIMEOUT/60:.1f} minutes)",
+        "max_reconnect_attempts": MAX_RECONNECT_ATTEMPTS,
+        "scan_duration": f"{SCAN_DURATION} seconds"
+    }
+})
+_HEALTH_BYTES = orjson.dumps({"status": "healthy", "message": "SESAME Web API is running"})
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
-    return {
-        "message": "SESAME Web API with Connection Pooling",
-        "version": "2.0.0",
-        "features": {
-            "connection_pooling": True,
-            "auto_reconnection": True,
-            "persistent_connections": True
-        },
-        "endpoints": {
-            "/toggle": "Toggle the SESAME lock (with connection pooling)",
-            "/lock": "Lock the SESAME device",
-            "/unlock": "Unlock the SESAME device", 
-            "/click": "Click the SESAME Bot",
-            "/status": "Get device status",
-            "/connect": "Manually establish connection",
-            "/disconnect": "Manually disconnect",
-            "/connection": "Get connection status",
-            "/health": "Health check"
-        },
-        "configuration": {
-            "connection_timeout": f"{CONNECTION_TIMEOUT} seconds ({CONNECTION_TIMEOUT/60:.1f} minutes)",
-            "max_reconnect_attempts": MAX_RECONNECT_ATTEMPTS,
-            "scan_duration": f"{SCAN_DURATION} seconds"
-        }
-    }
+    return Response(content=_ROOT_BYTES, media_type="application/json")
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "message": "SESAME Web API is running"}
+    return Response(content=_HEALTH_BYTES, media_type="application/json")
 
 
-@app.get("/toggle")
-async def toggle_lock() -> ToggleResponse:
+@app.get("/toggle", responses={200: {"model": ToggleResponse}})
+async def toggle_lock() -> ORJSONResponse:
     """
     Toggle the SESAME lock state.
     If locked, it will unlock. If unlocked, it will lock.
     """
     logger.info("Toggle endpoint called")
     
-    result = await perform_device_operation("toggle", "Web API Toggle")
+    result = await submit_device_operation("toggle", "Web API Toggle")
     
     if result["success"]:
-        return ToggleResponse(**result)
+        return model_response(ToggleResponse, result)
     else:
         raise HTTPException(status_code=500, detail=result["message"])
 
 
-@app.get("/lock")
-async def lock_device() -> ToggleResponse:
+@app.get("/lock", responses={200: {"model": ToggleResponse}})
+async def lock_device() -> ORJSONResponse:
     """Lock the SESAME device."""
     logger.info("Lock endpoint called")
     
-    result = await perform_device_operation("lock", "Web API Lock")
+    result = await submit_device_operation("lock", "Web API Lock")
     
     if result["success"]:
-        return ToggleResponse(**result)
+        return model_response(ToggleResponse, result)
     else:
         raise HTTPException(status_code=500, detail=result["message"])
 
 
-@app.get("/unlock")
-async def unlock_device() -> ToggleResponse:
+@app.get("/unlock", responses={200: {"model": ToggleResponse}})
+async def unlock_device() -> ORJSONResponse:
     """Unlock the SESAME device."""
     logger.info("Unlock endpoint called")
     
-    result = await perform_device_operation("unlock", "Web API Unlock")
+    result = await submit_device_operation("unlock", "Web API Unlock")
     
     if result["success"]:
-        return ToggleResponse(**result)
+        return model_response(ToggleResponse, result)
     else:
         raise HTTPException(status_code=500, detail=result["message"])
 
 
-@app.get("/click")
-async def click_bot() -> ToggleResponse:
+@app.get("/click", responses={200: {"model": ToggleResponse}})
+async def click_bot() -> ORJSONResponse:
     """Click the SESAME Bot."""
     logger.info("Click endpoint called")
     
-    result = await perform_device_operation("click", "Web API Click")
+    result = await submit_device_operation("click", "Web API Click")
     
     if result["success"]:
-        return ToggleResponse(**result)
+        return model_response(ToggleResponse, result)
     else:
         raise HTTPException(status_code=500, detail=result["message"])
 
 
-@app.get("/status")
-async def get_device_status() -> StatusResponse:
+@app.get("/status", responses={200: {"model": StatusResponse}})
+async def get_device_status() -> ORJSONResponse:
     """
     Get the current status of the SESAME device using connection pooling.
     """
     logger.info("Status endpoint called")
+    global _status_cache
     
     try:
-        # Ensure we have a valid connection (this handles both validation and connection)
-        success, _ = await connection_manager.ensure_connection()
-        if not success:
-            raise RuntimeError("Failed to establish connection to device")
-        
-        # Get the connected device
-        device = connection_manager.device
-        
-        # Get current status
-        mech_status = device.getMechStatus()
-        device_status = device.getDeviceStatus()
+        # Serve bursts of polls from the last result
+        if _status_cache and time.monotonic() - _status_cache[0] < STATUS_CACHE_TTL:
+            status = _status_cache[1]
+        else:
+            # Ensure we have a valid connection (this handles both validation and connection)
+            success, _ = await connection_manager.ensure_connection()
+            if not success:
+                raise RuntimeError("Failed to establish connection to device")
+            
+            status = connection_manager.build_status(connection_manager.device)
+            _status_cache = (time.monotonic(), status)
         
-        result = {
+        return model_response(StatusResponse, {
             "success": True,
             "message": "Device status retrieved successfully",
-            "device_id": device.getDeviceUUID(),
-            "product_model": str(device.productModel),
-            "device_status": str(device_status)
-        }
-        
-        # Add mechanical status if available
-        if mech_status:
-            result.update({
-                "battery_percentage": mech_status.getBatteryPrecentage(),
-                "battery_voltage": mech_status.getBatteryVoltage(),
-                "is_in_lock_range": mech_status.isInLockRange(),
-                "is_in_unlock_range": mech_status.isInUnlockRange()
-            })
-            
-            # Add position for SESAME 2/4
-            if hasattr(mech_status, 'getPosition'):
-                result["position"] = mech_status.getPosition()
-        
-        return StatusResponse(**result)
+            **status
+        })
         
     except Exception as e:
-        logger.error(f"Error getting device status: {str(e)}")
+        logger.error("Error getting device status: %s", e)
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
-@app.get("/connect")
-async def establish_connection() -> ConnectionResponse:
+@app.get("/connect", responses={200: {"model": ConnectionResponse}})
+async def establish_connection() -> ORJSONResponse:
     """
     Manually establish a connection to the SESAME device.
     This can be used to pre-establish a connection for faster subsequent operations.
@@ -549,20 +834,20 @@ async def establish_connection() -> ConnectionResponse:
                 "device_id": device_info.get("device_id"),
                 "product_model": device_info.get("product_model"),
                 "connection_established": True,
-                "connection_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(device_info.get("connection_time")))
+                "connection_time": connection_manager.connection_time_str
             }
             
-            return ConnectionResponse(**result)
+            return model_response(ConnectionResponse, result)
         else:
             raise RuntimeError("Failed to establish connection")
             
     except Exception as e:
-        logger.error(f"Error establishing connection: {str(e)}")
+        logger.error("Error establishing connection: %s", e)
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
-@app.get("/disconnect")
-async def disconnect_device() -> ConnectionResponse:
+@app.get("/disconnect", responses={200: {"model": ConnectionResponse}})
+async def disconnect_device() -> ORJSONResponse:
     """
     Manually disconnect from the SESAME device.
     """
@@ -580,7 +865,7 @@ async def disconnect_device() -> ConnectionResponse:
                 "connection_working": False,
                 "connection_time": None
             }
-            return ConnectionResponse(**result)
+            return model_response(ConnectionResponse, result)
         
         # Get device info before disconnecting
         device_info = connection_manager.get_device_info()
@@ -598,15 +883,15 @@ async def disconnect_device() -> ConnectionResponse:
             "connection_time": None
         }
         
-        return ConnectionResponse(**result)
+        return model_response(ConnectionResponse, result)
         
     except Exception as e:
-        logger.error(f"Error disconnecting device: {str(e)}")
+        logger.error("Error disconnecting device: %s", e)
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
-@app.get("/connection")
-async def get_connection_status() -> ConnectionResponse:
+@app.get("/connection", responses={200: {"model": ConnectionResponse}})
+async def get_connection_status() -> ORJSONResponse:
     """
     Get the current connection status and information.
     """
@@ -625,13 +910,13 @@ async def get_connection_status() -> ConnectionResponse:
             "product_model": device_info.get("product_model"),
             "connection_established": device_info.get("is_connected", False),
             "connection_working": connection_working,
-            "connection_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(device_info.get("connection_time"))) if device_info.get("connection_time") else None
+            "connection_time": connection_manager.connection_time_str
         }
         
-        return ConnectionResponse(**result)
+        return model_response(ConnectionResponse, result)
         
     except Exception as e:
-        logger.error(f"Error getting connection status: {str(e)}")
+        logger.error("Error getting connection status: %s", e)
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
@@ -675,7 +960,7 @@ async def test_connection() -> dict:
             }
         
     except Exception as e:
-        logger.error(f"Error testing connection: {str(e)}")
+        logger.error("Error testing connection: %s", e)
         return {
             "success": False,
             "message": f"Connection test error: {str(e)}",
@@ -687,14 +972,10 @@ if __name__ == "__main__":
     import uvicorn
     
     # Check if required environment variables are set
-    if not BLE_UUID:
-        print("ERROR: SESAME_BLE_UUID environment variable not set")
-        print("Please set the BLE UUID of your SESAME device")
-        exit(1)
-    
-    if not SECRET_KEY or not PUBLIC_KEY:
-        print("ERROR: SESAME_SECRET_KEY and SESAME_PUBLIC_KEY environment variables not set")
-        print("Please set your device's secret key and public key")
+    try:
+        config.validate()
+    except ValueError as e:
+        print(f"ERROR: {e}")
         print("You can get these from the QR code using: https://sesame-qr-reader.vercel.app/")
         exit(1)
     
@@ -703,7 +984,7 @@ if __name__ == "__main__":
     print(f"Scan Duration: {SCAN_DURATION} seconds")
     print(f"Connection Timeout: {CONNECTION_TIMEOUT} seconds ({CONNECTION_TIMEOUT/60:.1f} minutes)")
     print(f"Max Reconnect Attempts: {MAX_RECONNECT_ATTEMPTS}")
-    print("Server will be available at: http://localhost:8000")
-    print("API documentation at: http://localhost:8000/docs")
+    print(f"Server will be available at: http://localhost:{config.PORT}")
+    print(f"API documentation at: http://localhost:{config.PORT}/docs")
     
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host=config.HOST, port=config.PORT, loop=config.event_loop, http="httptools")
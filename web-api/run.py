@@ -32,5 +32,7 @@ if __name__ == "__main__":
         host=config.HOST, 
         port=config.PORT,
         reload=config.DEBUG,
-        log_level=config.LOG_LEVEL.lower()
+        log_level=config.LOG_LEVEL.lower(),
+        loop=config.event_loop,
+        http="httptools"
     )